@@ -10,25 +10,54 @@
 
 
 import argparse
+import sys
+import textwrap
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from comexdown import get_complete, get_table, get_year, get_year_nbm
+from comexdown import download, get_complete, get_table, get_year, get_year_nbm
 from comexdown.tables import AUX_TABLES, TABLES
 
 
-def expand_years(args_years: str) -> list[int]:
-    years = []
+def iter_years(args_years: Iterable[str]) -> Iterator[int]:
     for arg in args_years:
         if ":" in arg:
             start, end = arg.split(":")
             start, end = int(start), int(end)
             if start > end:
-                years += list(range(start, end - 1, -1))
+                yield from range(start, end - 1, -1)
             else:
-                years += list(range(start, end + 1))
+                yield from range(start, end + 1)
         else:
-            years.append(int(arg))
-    return years
+            yield int(arg)
+
+
+def expand_years(args_years: list[str]) -> list[int]:
+    # Not used by the CLI itself, kept as a public helper over iter_years
+    return list(iter_years(args_years))
+
+
+def run_tasks(tasks: Iterable[tuple], jobs: int = 1):
+    """Run `(function, kwargs)` tasks, concurrently when `jobs` > 1"""
+    if jobs <= 1:
+        for func, kwargs in tasks:
+            func(**kwargs)
+        return
+    # Workers print no progress bars, they would overwrite each other
+    with ThreadPoolExecutor(
+        max_workers=jobs, initializer=download.quiet_progress,
+    ) as executor:
+        try:
+            futures = [
+                executor.submit(func, **kwargs) for func, kwargs in tasks
+            ]
+            for future in futures:
+                future.result()
+        except BaseException:
+            # Stop at the first error (or Ctrl-C) like the serial loop does
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
 
 # =============================================================================
@@ -51,7 +80,21 @@ def download_trade(args: argparse.Namespace):
         )
         return
 
-    for year in expand_years(args.years):
+    run_tasks(
+        trade_tasks(args.years, exp=exp, imp=imp, mun=mun, path=args.path),
+        jobs=args.jobs,
+    )
+
+
+def trade_tasks(
+    args_years: Iterable[str],
+    exp: bool,
+    imp: bool,
+    mun: bool,
+    path: Path,
+) -> Iterator[tuple]:
+    """Yield the download tasks for each year, as the years are parsed"""
+    for year in iter_years(args_years):
         if year < 1989:
             print("Year not available!", year)
             continue
@@ -61,19 +104,20 @@ def download_trade(args: argparse.Namespace):
                     f"Municipality data for this year ({year}) not available!"
                     "\nDownloading national data instead..."
                 )
-            get_year_nbm(
-                year=year,
-                exp=exp,
-                imp=imp,
-                path=args.path,
+            yield (
+                get_year_nbm,
+                {"year": year, "exp": exp, "imp": imp, "path": path},
             )
         else:
-            get_year(
-                year=year,
-                exp=exp,
-                imp=imp,
-                mun=mun,
-                path=args.path,
+            yield (
+                get_year,
+                {
+                    "year": year,
+                    "exp": exp,
+                    "imp": imp,
+                    "mun": mun,
+                    "path": path,
+                },
             )
 
 
@@ -83,41 +127,28 @@ def download_trade(args: argparse.Namespace):
 def download_tables(args: argparse.Namespace):
     if args.tables == []:
         print_code_tables()
-    if "all" in args.tables:
-        for table in AUX_TABLES:
-            get_table(
-                table=table,
-                path=args.path,
-            )
-        return
-    for table in args.tables:
-        get_table(
-            table=table,
-            path=args.path,
-        )
+    tables = list(AUX_TABLES) if "all" in args.tables else args.tables
+    # A single table is downloaded in the main thread, without a pool
+    run_tasks(
+        [(get_table, {"table": table, "path": args.path}) for table in tables],
+        jobs=min(args.jobs, len(tables)),
+    )
 
 
 def print_code_tables():
-    print("\nAvailable code tables:")
+    lines = ["", "Available code tables:"]
     for table in TABLES:
-        print(f"\n  {table: <11}{TABLES[table]['name']}")
-        description = TABLES[table]["description"]
-        len_description = len(description)
-        i = 0
-        if len_description > 70:
-            print(13 * " ", end="")
-            for word in description.split(" "):
-                i += len(word) + 1
-                if i < 70:
-                    print(word, end=" ")
-                else:
-                    print(word)
-                    print(13 * " ", end="")
-                    i = 0
-            print("")
-        else:
-            print(12 * " ", description)
-    print("")
+        lines.append(f"\n  {table: <11}{TABLES[table]['name']}")
+        lines.append(
+            textwrap.fill(
+                TABLES[table]["description"],
+                width=83,
+                initial_indent=13 * " ",
+                subsequent_indent=13 * " ",
+            )
+        )
+    lines.append("")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def download_help(args: argparse.Namespace):
@@ -152,6 +183,14 @@ def set_download_trade_subparser(
         default=default_output,
         help="Output path directory where files will be saved",
     )
+    download_trade_parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of files to download concurrently",
+    )
     download_trade_parser.set_defaults(func=download_trade)
 
 
@@ -180,10 +219,18 @@ def set_download_table_subparser(
         default=default_output,
         help="Output path directory where files will be saved",
     )
+    download_table_parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of files to download concurrently",
+    )
     download_table_parser.set_defaults(func=download_tables)
 
 
-def set_parser() -> argparse.ArgumentParser:
+def set_parser(argv: list[str] = None) -> argparse.ArgumentParser:
     default_output = Path(".", "data", "secex-comex")
 
     parser = argparse.ArgumentParser(
@@ -192,14 +239,25 @@ def set_parser() -> argparse.ArgumentParser:
 
     subparsers = parser.add_subparsers()
 
-    set_download_trade_subparser(subparsers, default_output)
-    set_download_table_subparser(subparsers, default_output)
+    set_subparsers = {
+        "trade": set_download_trade_subparser,
+        "table": set_download_table_subparser,
+    }
+    # Only build the subparser of the command being dispatched, if known
+    command = None
+    if argv is not None:
+        command = next((a for a in argv if not a.startswith("-")), None)
+    if command in set_subparsers:
+        set_subparsers[command](subparsers, default_output)
+    else:
+        for set_subparser in set_subparsers.values():
+            set_subparser(subparsers, default_output)
 
     return parser
 
 
 def main():
-    parser = set_parser()
+    parser = set_parser(sys.argv[1:])
     args = parser.parse_args()
 
     args.func(args)
@@ -1,35 +1,368 @@
 """Functions to download trade data and code tables"""
 
 
+import base64
+import contextlib
+import email.utils
+import errno
+import http.client
+import os
+import shutil
 import ssl
 import sys
+import threading
 import time
+import types
+from functools import lru_cache
 from pathlib import Path
-from urllib import error, request
+from urllib import error, parse, request
 
 from comexdown.tables import AUX_TABLES, TABLES
 
 CANON_URL = "https://balanca.economia.gov.br/balanca/bd/"
 
+_URLS = types.MappingProxyType({
+    "table": CANON_URL + "tabelas/{filename}",
+    "exp": CANON_URL + "comexstat-bd/ncm/EXP_{year}.csv",
+    "imp": CANON_URL + "comexstat-bd/ncm/IMP_{year}.csv",
+    "exp_mun": CANON_URL + "comexstat-bd/mun/EXP_{year}_MUN.csv",
+    "imp_mun": CANON_URL + "comexstat-bd/mun/IMP_{year}_MUN.csv",
+    "exp_nbm": CANON_URL + "comexstat-bd/nbm/EXP_{year}_NBM.csv",
+    "imp_nbm": CANON_URL + "comexstat-bd/nbm/IMP_{year}_NBM.csv",
+    "exp_complete": CANON_URL + "comexstat-bd/ncm/EXP_COMPLETA.zip",
+    "imp_complete": CANON_URL + "comexstat-bd/ncm/IMP_COMPLETA.zip",
+    "exp_mun_complete": CANON_URL + "comexstat-bd/mun/EXP_COMPLETA_MUN.zip",
+    "imp_mun_complete": CANON_URL + "comexstat-bd/mun/IMP_COMPLETA_MUN.zip",
+})
+
+TIMEOUT = 60
+MAX_REDIRECTS = 5
+_REDIRECTS = (301, 302, 303, 307, 308)
+PROGRESS_INTERVAL = 0.1  # Seconds between progress bar redraws
+DRAIN_LIMIT = 1 << 20  # Largest unread body drained to keep a connection
+SYNC_LIMIT = 64 << 20  # Smallest file written back before dropping its cache
+
+_SSL_CONTEXT = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_SSL_CONTEXT.check_hostname = False
+_SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+# Directories already created by download_file in this process
+_MKDIR_CACHE: set[Path] = set()
+
+# Keep-alive connections, one per (scheme, host) in each download thread
+_CONNECTIONS = threading.local()
+
+# Per-thread switch of the progress bar, see quiet_progress()
+_PROGRESS = threading.local()
+
+_STDOUT_LOCK = threading.Lock()
+
+
+def _write(text: str):
+    """Write `text` to stdout, serialized between download threads"""
+    with _STDOUT_LOCK:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def _proxy_for(scheme: str, host: str) -> parse.SplitResult | None:
+    """Get the proxy configured for `scheme` requests to `host`, if any
+
+    Uses the same settings as `urllib.request.urlopen`: the *_PROXY and
+    NO_PROXY environment variables, or the system configuration.
+    """
+    proxy = request.getproxies().get(scheme)
+    if not proxy or request.proxy_bypass(host):
+        return None
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    return parse.urlsplit(proxy)
+
+
+def _proxy_headers(proxy: parse.SplitResult) -> dict:
+    if proxy.username is None:
+        return {}
+    credentials = "{}:{}".format(
+        parse.unquote(proxy.username), parse.unquote(proxy.password or ""))
+    token = base64.b64encode(credentials.encode()).decode("ascii")
+    return {"Proxy-Authorization": f"Basic {token}"}
+
+
+def quiet_progress():
+    """Disable the progress bar of downloads made by the calling thread
+
+    Meant as the initializer of download worker threads, whose progress
+    bars would overwrite each other on the same line. Only the start and
+    end of each download are printed.
+    """
+    _PROGRESS.enabled = False
+
+
+def _progress_enabled() -> bool:
+    return getattr(_PROGRESS, "enabled", True)
+
+
+def _get_connection(
+    scheme: str,
+    host: str,
+    proxy: parse.SplitResult | None = None,
+) -> http.client.HTTPConnection:
+    """Get the current thread's keep-alive connection to `host`
+
+    HTTPS requests through a `proxy` are tunneled with CONNECT, plain HTTP
+    requests are sent to the proxy itself.
+    """
+    pool = getattr(_CONNECTIONS, "pool", None)
+    if pool is None:
+        pool = _CONNECTIONS.pool = {}
+    conn = pool.get((scheme, host))
+    if conn is None:
+        if proxy is not None:
+            address = (proxy.hostname, proxy.port or 80)
+        else:
+            address = (host,)
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                *address, timeout=TIMEOUT, context=_SSL_CONTEXT)
+            if proxy is not None:
+                conn.set_tunnel(host, headers=_proxy_headers(proxy))
+        else:
+            conn = http.client.HTTPConnection(*address, timeout=TIMEOUT)
+        pool[(scheme, host)] = conn
+    return conn
+
+
+def _send(
+    conn: http.client.HTTPConnection,
+    target: str,
+    headers: dict,
+) -> http.client.HTTPResponse:
+    try:
+        conn.request("GET", target, headers=headers)
+        return conn.getresponse()
+    except (
+        http.client.RemoteDisconnected,
+        ConnectionResetError,
+        BrokenPipeError,
+    ):
+        # The server dropped the idle keep-alive connection, reconnect
+        conn.close()
+        conn.request("GET", target, headers=headers)
+        return conn.getresponse()
+
+
+def _request(
+    url: str,
+    headers: dict = None,
+) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+    """Send a GET request for `url` over a pooled connection
+
+    Redirects are followed and error statuses raise `HTTPError`.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = parse.urlsplit(url)
+        proxy = _proxy_for(parts.scheme, parts.hostname)
+        conn = _get_connection(parts.scheme, parts.netloc, proxy)
+        request_headers = dict(headers or {})
+        if proxy is not None and parts.scheme == "http":
+            # Plain HTTP proxies take the absolute URL as request target
+            target = parse.urlunsplit(parts._replace(fragment=""))
+            request_headers.update(_proxy_headers(proxy))
+        else:
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+        try:
+            resp = _send(conn, target, request_headers)
+            if resp.status in _REDIRECTS or resp.status >= 400:
+                resp.read()
+        except BaseException:
+            # A failed exchange leaves http.client mid-request, so the
+            # connection can't be reused
+            conn.close()
+            raise
+        if resp.status in _REDIRECTS:
+            url = parse.urljoin(url, resp.getheader("Location"))
+            continue
+        if resp.status >= 400:
+            raise error.HTTPError(
+                url, resp.status, resp.reason, resp.headers, None)
+        return conn, resp
+    raise error.URLError(f"Too many redirects: {url}")
+
+
+@contextlib.contextmanager
+def open_url(url: str, headers: dict = None):
+    """Open `url` reusing the thread's keep-alive connection to its host
+
+    When the response body is left unread, small bodies are drained so the
+    connection can serve the next request. Otherwise the connection is
+    closed instead of being returned to the pool.
+    """
+    conn, resp = _request(url, headers)
+    try:
+        yield resp
+    except BaseException:
+        conn.close()
+        raise
+    if not resp.isclosed():
+        remaining = getattr(resp, "length", None)
+        if remaining is not None and remaining <= DRAIN_LIMIT:
+            try:
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+        else:
+            conn.close()
 
-def is_more_recent(response: request.Request, dest: Path) -> bool:
-    """Check if the file is more recent than the one in `dest`"""
+
+def is_more_recent(
+    response: http.client.HTTPResponse,
+    local_mtime: float | None,
+) -> bool:
+    """Check if the file is more recent than a local copy last modified at
+    `local_mtime` (None if there is no local copy)"""
+    if local_mtime is None:
+        return True
     # Check Last-Modified header
     last_modified = response.headers.get("Last-Modified")
     if last_modified is not None:
-        last_modified = time.mktime(
-            time.strptime(last_modified, "%a, %d %b %Y %H:%M:%S %Z")
-        )
-        if dest.stat().st_mtime < last_modified:
+        try:
+            last_modified = email.utils.parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+        if local_mtime < last_modified.timestamp():
             return True
     return False
 
 
+# Progress bars for each number of filled positions
+_BARS = tuple("[{:<70}]".format("=" * i) for i in range(71))
+
+
+def _print_progress(size: int, length: int):
+    p = size / length
+    bar = _BARS[min(int(p * 70), 70)]
+    if size > 2**20:
+        size_txt = "{: >9.2f} MiB".format(size / 2**20)
+    else:
+        size_txt = "{: >9.2f} KiB".format(size / 2**10)
+    _write(f"{bar} {p*100: >5.1f}% {size_txt}\r")
+
+
+def _preallocate(fd: int, offset: int, length: int):
+    """Reserve disk space for the rest of the download, where supported"""
+    if not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError as e:
+        # Fail early when the disk is full, ignore unsupported filesystems
+        if e.errno == errno.ENOSPC:
+            raise
+
+
+def _drop_cache(fd: int, size: int):
+    """Hint the OS to evict the downloaded file from the page cache"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        # Only clean pages are evicted, so write large files back first
+        if size >= SYNC_LIMIT:
+            os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+
+
+class _ProgressWriter:
+    """File wrapper that reports the download progress as it is written"""
+
+    def __init__(self, f, length: int | None):
+        self.f = f
+        self.length = length
+        self.size = 0
+        self.last_print = 0.0
+
+    def write(self, data: bytes) -> int:
+        n = self.f.write(data)
+        self.size += n
+        if self.length:
+            now = time.monotonic()
+            if (
+                now - self.last_print > PROGRESS_INTERVAL
+                or self.size >= self.length
+            ):
+                _print_progress(self.size, self.length)
+                self.last_print = now
+        return n
+
+
+def _range_validator(response: http.client.HTTPResponse) -> str | None:
+    """Get a validator of the response usable in an If-Range header"""
+    etag = response.getheader("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.getheader("Last-Modified")
+
+
+def _part_path(dest: Path) -> Path:
+    """Path of the partial file a download is written to before completing"""
+    return dest.with_name(dest.name + ".part")
+
+
+def _download_stream(
+    response: http.client.HTTPResponse,
+    dest: Path,
+    blocksize: int,
+    resume: int = 0,
+) -> int:
+    """Write the body of `response` to `dest` and return its size
+
+    The body is first written to a `.part` file next to `dest`, which only
+    replaces `dest` once the download is complete. If `response` is a
+    206 Partial Content reply, the body is appended to the first `resume`
+    bytes already in the `.part` file.
+    """
+    if response.status == 206:
+        content_range = response.getheader("content-range", "")
+        if not content_range.startswith(f"bytes {resume}-"):
+            raise http.client.HTTPException(
+                f"Unexpected Content-Range: {content_range!r}")
+    else:
+        resume = 0
+
+    length = response.getheader("content-length")
+    if length:
+        length = int(length) + resume
+
+    tmp = _part_path(dest)
+    with open(tmp, "r+b" if resume else "wb") as f:
+        f.seek(resume)
+        f.truncate()
+        writer = _ProgressWriter(f, length if _progress_enabled() else None)
+        writer.size = resume
+        try:
+            if length:
+                _preallocate(f.fileno(), resume, length - resume)
+            shutil.copyfileobj(response, writer, length=blocksize)
+        finally:
+            # Trim preallocated space the download did not reach, so the
+            # size of the .part file is where a retry resumes from
+            f.truncate()
+        f.flush()
+        _drop_cache(f.fileno(), writer.size)
+    if length and writer.size < length:
+        raise http.client.IncompleteRead(b"", length - writer.size)
+    os.replace(tmp, dest)
+    return writer.size
+
+
 def download_file(
     url: str,
     filepath: Path = None,
     retry: int = 3,
-    blocksize: int = 1024,
+    blocksize: int = 1 << 20,
 ) -> Path | None:
     """Downloads the file in `url` and saves it in `path`
 
@@ -41,7 +374,7 @@ def download_file(
         The destination path of downloaded file
     retry: int [default=3]
         Number of retries until raising exception
-    blocksize: int [default=1024]
+    blocksize: int [default=1048576]
         The block size of requests
 
     returns: Path
@@ -49,65 +382,112 @@ def download_file(
     """
 
     if filepath is not None:
-        if not filepath.parent.exists():
-            filepath.parent.makedirs(parents=True)
+        if filepath.parent not in _MKDIR_CACHE:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            _MKDIR_CACHE.add(filepath.parent)
         dest = filepath
     else:
         dest = Path(url.rsplit("/", maxsplit=1)[1])
+    dest_str = os.fspath(dest)
+    # Files are saved exactly as served, never content-encoded
+    headers = {"Accept-Encoding": "identity"}
+    try:
+        local_mtime = os.stat(dest_str).st_mtime
+    except FileNotFoundError:
+        local_mtime = None
+    else:
+        # Let the server answer 304 Not Modified instead of sending the body
+        headers["If-Modified-Since"] = email.utils.formatdate(
+            local_mtime, usegmt=True)
+    tmp = _part_path(dest)
+    resume = 0
+    validator = None
     for x in range(retry):
-        sys.stdout.write(f"Downloading: {url:<50} --> {dest}\n")
-        sys.stdout.flush()
+        _write(f"Downloading: {url:<50} --> {dest}\n")
+        if resume:
+            _write(f"             Resuming {dest} from byte {resume}\n")
         try:
-            resp = request.urlopen(url, context=ssl.SSLContext())
-
-            if not is_more_recent(resp, dest):
-                sys.stdout.write(f"             {dest} is up to date.\n")
-                sys.stdout.flush()
-                return
-
-            # Download file
-            length = resp.getheader("content-length")
-            if length:
-                length = int(length)
-
-            size = 0
-            with open(dest, "wb") as f:
-                while True:
-                    buf1 = resp.read(blocksize)
-                    if not buf1:
-                        break
-                    f.write(buf1)
-                    size += len(buf1)
-                    p = size / length
-                    bar = "[{:<70}]".format("=" * int(p * 70))
-                    if size > 2**20:
-                        size_txt = "{: >9.2f} MiB".format(size / 2**20)
-                    else:
-                        size_txt = "{: >9.2f} KiB".format(size / 2**10)
-                    if length:
-                        sys.stdout.write(
-                            f"{bar} {p*100: >5.1f}% {size_txt}\r")
-                        sys.stdout.flush()
-
-        except error.URLError as e:
-            sys.stdout.write(f"\nError... {e}")
-            sys.stdout.flush()
+            with open_url(url, headers) as resp:
+
+                if resp.status == 304:
+                    resp.read()
+                    _write(f"             {dest} is up to date.\n")
+                    return
+
+                # Fallback for servers that ignore If-Modified-Since
+                if not resume and not is_more_recent(resp, local_mtime):
+                    _write(f"             {dest} is up to date.\n")
+                    return
+
+                validator = _range_validator(resp)
+                _download_stream(resp, dest, blocksize, resume)
+
+        except (OSError, http.client.HTTPException) as e:
+            if _progress_enabled():
+                _write(f"\nError... {e}\n")
+            else:
+                _write(f"Error downloading {url}: {e}\n")
             time.sleep(3)
             if x == retry - 1:
                 raise
+            # Ask for the rest of the partial file on the next attempt
+            try:
+                resume = os.stat(tmp).st_size
+            except FileNotFoundError:
+                resume = 0
+            headers.pop("Range", None)
+            headers.pop("If-Range", None)
+            if resume and validator:
+                headers.pop("If-Modified-Since", None)
+                headers["Range"] = f"bytes={resume}-"
+                # Servers send the whole file if it changed in the meantime
+                headers["If-Range"] = validator
+            else:
+                resume = 0
 
         else:
-            sys.stdout.write("\n")
-            sys.stdout.flush()
+            if _progress_enabled():
+                _write("\n")
+            else:
+                _write(f"             {dest} downloaded.\n")
             break
 
     return dest
 
 
 def table(table_name: str, path: Path) -> Path | None:
-    url = CANON_URL + "tabelas/" + AUX_TABLES[table_name]
-    filepath = download_file(url, path)
-    return filepath
+    url = _URLS["table"].format(filename=AUX_TABLES[table_name])
+    return download_file(url, path)
+
+
+@lru_cache(maxsize=512)
+def _trade_url(kind: str, year: int | None) -> str:
+    if kind not in _URLS or kind == "table":
+        raise ValueError(f"Invalid argument kind={kind}")
+    if kind.endswith("_complete"):
+        if year is not None:
+            raise ValueError(f"Invalid argument year={year} for kind={kind}")
+    elif year is None:
+        raise ValueError(f"Argument year is required for kind={kind}")
+    return _URLS[kind].format_map({"year": year})
+
+
+def trade(kind: str, year: int | None, path: Path) -> Path | None:
+    """Downloads a trade data file
+
+    Parameters
+    ----------
+    kind: str
+        Kind of trade data file: "exp", "imp", "exp_mun", "imp_mun",
+        "exp_nbm", "imp_nbm", "exp_complete", "imp_complete",
+        "exp_mun_complete" or "imp_mun_complete"
+    year: int
+        Year to download, None for complete data files
+    path: Path
+        Destination path of downloaded file
+
+    """
+    return download_file(_trade_url(kind, year), path)
 
 
 def exp(year: int, path: Path) -> Path | None:
@@ -121,9 +501,7 @@ def exp(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/ncm/EXP_{year}.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("exp", year, path)
 
 
 def imp(year: int, path: Path) -> Path | None:
@@ -137,9 +515,7 @@ def imp(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/ncm/IMP_{year}.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("imp", year, path)
 
 
 def exp_mun(year: int, path: Path) -> Path | None:
@@ -153,9 +529,7 @@ def exp_mun(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/mun/EXP_{year}_MUN.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("exp_mun", year, path)
 
 
 def imp_mun(year: int, path: Path) -> Path | None:
@@ -169,9 +543,7 @@ def imp_mun(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/mun/IMP_{year}_MUN.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("imp_mun", year, path)
 
 
 def exp_nbm(year: int, path: Path) -> Path | None:
@@ -185,9 +557,7 @@ def exp_nbm(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/nbm/EXP_{year}_NBM.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("exp_nbm", year, path)
 
 
 def imp_nbm(year: int, path: Path) -> Path | None:
@@ -201,9 +571,7 @@ def imp_nbm(year: int, path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/nbm/IMP_{year}_NBM.csv".format(year=year)
-    filepath = download_file(url, path)
-    return filepath
+    return trade("imp_nbm", year, path)
 
 
 def exp_complete(path: Path) -> Path | None:
@@ -215,9 +583,7 @@ def exp_complete(path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/ncm/EXP_COMPLETA.zip"
-    filepath = download_file(url, path)
-    return filepath
+    return trade("exp_complete", None, path)
 
 
 def imp_complete(path: Path) -> Path | None:
@@ -229,9 +595,7 @@ def imp_complete(path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/ncm/IMP_COMPLETA.zip"
-    filepath = download_file(url, path)
-    return filepath
+    return trade("imp_complete", None, path)
 
 
 def exp_mun_complete(path: Path) -> Path | None:
@@ -243,9 +607,7 @@ def exp_mun_complete(path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/mun/EXP_COMPLETA_MUN.zip"
-    filepath = download_file(url, path)
-    return filepath
+    return trade("exp_mun_complete", None, path)
 
 
 def imp_mun_complete(path: Path) -> Path | None:
@@ -257,9 +619,7 @@ def imp_mun_complete(path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = CANON_URL + "comexstat-bd/mun/IMP_COMPLETA_MUN.zip"
-    filepath = download_file(url, path)
-    return filepath
+    return trade("imp_mun_complete", None, path)
 
 
 def agronegocio(path: Path) -> Path | None:
@@ -271,6 +631,4 @@ def agronegocio(path: Path) -> Path | None:
         Destination path directory to save file
 
     """
-    url = TABLES["agronegocio"]["url"]
-    filepath = download_file(url, path)
-    return filepath
+    return download_file(TABLES["agronegocio"]["url"], path)
@@ -14,62 +14,81 @@ root
 """
 
 
+from functools import lru_cache
 from pathlib import Path
 
-from comexdown.tables import TABLES
+from comexdown.tables import AUX_TABLES
 
+# Directory name and file prefix of each trade direction
+_DIRECTIONS = {
+    "exp": ("exp", "EXP_"),
+    "imp": ("imp", "IMP_"),
+}
 
+# Path of each code table relative to the root directory
+_AUX_PATHS = {
+    name: Path("auxiliary-tables", filename)
+    for name, filename in AUX_TABLES.items()
+}
+
+
+def _direction(direction: str) -> tuple[str, str]:
+    # Only lowercase the argument when it is not already a known key
+    names = _DIRECTIONS.get(direction) or _DIRECTIONS.get(direction.lower())
+    if names is None:
+        raise ValueError(f"Invalid argument direction={direction}")
+    return names
+
+
+@lru_cache(maxsize=512)
 def path_aux(
     root: Path,
     name: str,
 ) -> Path:
-    if isinstance(root, str):
-        root = Path(root)
-    file_info = TABLES.get(name)
-    if not file_info:
+    subpath = _AUX_PATHS.get(name)
+    if subpath is None:
         return
-    filename = file_info.get("file_ref")
-    path = root / "auxiliary-tables" / filename
-    return path
+    return Path(root, subpath)
 
 
+@lru_cache(maxsize=512)
 def path_trade(
     root: Path,
     direction: str,
     year: int,
     mun: bool = False,
 ) -> Path:
-    if isinstance(root, str):
-        root = Path(root)
-    prefix = sufix = ""
-    if direction.lower() == "exp":
-        prefix = "EXP_"
-    elif direction.lower() == "imp":
-        prefix = "IMP_"
-    else:
-        raise ValueError(f"Invalid argument direction={direction}")
+    direction, prefix = _direction(direction)
+    sufix = ""
     if mun:
         sufix = "_MUN"
         direction = direction + "-mun"
-    return root / direction / f"{prefix}{year}{sufix}.csv"
+    return Path(root, direction, f"{prefix}{year}{sufix}.csv")
 
 
+@lru_cache(maxsize=512)
 def path_trade_nbm(
     root: Path,
     direction: str,
     year: int,
 ) -> Path:
-    if isinstance(root, str):
-        root = Path(root)
-    prefix = ""
-    if direction.lower() == "exp":
-        prefix = "EXP_"
-    elif direction.lower() == "imp":
-        prefix = "IMP_"
-    else:
-        raise ValueError(f"Invalid argument direction={direction}")
+    direction, prefix = _direction(direction)
     direction = direction + "-nbm"
-    return root / direction / f"{prefix}{year}_NBM.csv"
+    return Path(root, direction, f"{prefix}{year}_NBM.csv")
+
+
+@lru_cache(maxsize=512)
+def path_complete(
+    root: Path,
+    direction: str,
+    mun: bool = False,
+) -> Path:
+    direction, prefix = _direction(direction)
+    sufix = ""
+    if mun:
+        sufix = "_MUN"
+        direction = direction + "-mun"
+    return Path(root, direction, f"{prefix}COMPLETA{sufix}.zip")
 
 
 def get_creation_time(path: Path) -> float:
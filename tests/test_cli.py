@@ -1,10 +1,12 @@
 import argparse
+import io
+import time
 import unittest
 from collections import namedtuple
 from pathlib import Path
 from unittest import mock
 
-from comexdown import cli
+from comexdown import cli, download
 from comexdown.tables import AUX_TABLES
 
 
@@ -14,6 +16,16 @@ class TestCliFunctions(unittest.TestCase):
         parser = cli.set_parser()
         self.assertIsInstance(parser, argparse.ArgumentParser)
 
+    def test_set_parser_lazy(self):
+        parser = cli.set_parser(["trade", "2020", "-o", "data"])
+        args = parser.parse_args(["trade", "2020", "-o", "data"])
+        self.assertEqual(args.func, cli.download_trade)
+        with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            parser.parse_args(["table", "ncm"])
+        parser = cli.set_parser(["--help"])
+        args = parser.parse_args(["table", "ncm"])
+        self.assertEqual(args.func, cli.download_tables)
+
     def test_expand_years(self):
         years = cli.expand_years(["2010:2019", "2000:2005"])
         self.assertListEqual(
@@ -41,6 +53,52 @@ class TestCliFunctions(unittest.TestCase):
             [2010] + [2005, 2004, 2003, 2002, 2001, 2000]
         )
 
+    def test_iter_years(self):
+        years = cli.iter_years(["2010", "2005:2003"])
+        self.assertNotIsInstance(years, list)
+        self.assertListEqual(list(years), [2010, 2005, 2004, 2003])
+
+    def test_run_tasks(self):
+        for jobs in (1, 4):
+            func = mock.Mock()
+            cli.run_tasks([(func, {"year": y}) for y in range(3)], jobs=jobs)
+            self.assertEqual(func.call_count, 3)
+            func.assert_any_call(year=2)
+
+    def test_run_tasks_quiet_progress(self):
+        enabled = []
+
+        def task():
+            enabled.append(download._progress_enabled())
+
+        cli.run_tasks([(task, {}) for _ in range(4)], jobs=2)
+        self.assertEqual(enabled, [False] * 4)
+        cli.run_tasks([(task, {})], jobs=1)
+        self.assertIs(enabled[-1], True)
+
+    def test_run_tasks_error_cancels_pending(self):
+        def fail():
+            raise ValueError("download failed")
+
+        def slow():
+            time.sleep(0.05)
+
+        func = mock.Mock(side_effect=slow)
+        tasks = [(fail, {})] + [(func, {}) for _ in range(7)]
+        with self.assertRaises(ValueError):
+            cli.run_tasks(tasks, jobs=2)
+        self.assertLess(func.call_count, 7)
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_code_tables(self, mock_stdout):
+        cli.print_code_tables()
+        output = mock_stdout.getvalue()
+        for table in AUX_TABLES:
+            self.assertIn(f"  {table: <11}", output)
+        for line in output.splitlines():
+            if line.startswith(13 * " "):
+                self.assertLessEqual(len(line), 83)
+
     @mock.patch("comexdown.cli.set_parser")
     def test_main(self, mock_set_parser):
         cli.main()
@@ -58,6 +116,20 @@ class TestCliDownloadTrade(unittest.TestCase):
         self.Args = namedtuple("Args", ["exp", "imp", "mun"])
         self.o = "./data"
 
+    @mock.patch("comexdown.cli.get_year_nbm")
+    @mock.patch("comexdown.cli.get_year")
+    def test_download_trade_jobs(self, mock_get_year, mock_get_year_nbm):
+        args = self.parser.parse_args(
+            ["trade", "1995:2000", "-exp", "-j", "4", "-o", self.o]
+        )
+        self.assertEqual(args.jobs, 4)
+        args.func(args)
+        self.assertEqual(mock_get_year.call_count, 4)
+        self.assertEqual(mock_get_year_nbm.call_count, 2)
+        mock_get_year.assert_any_call(
+            year=2000, exp=True, imp=False, mun=False, path=Path(self.o)
+        )
+
 
 class TestCliDownloadCode(unittest.TestCase):
 
@@ -75,6 +147,26 @@ class TestCliDownloadCode(unittest.TestCase):
         self.args.func(self.args)
         mock_print_code_tables.assert_called()
 
+    @mock.patch("comexdown.cli.run_tasks")
+    def test_download_table_single(self, mock_run_tasks):
+        args = self.parser.parse_args(["table", "ncm"])
+        args.func(args)
+        self.assertEqual(mock_run_tasks.call_args.kwargs["jobs"], 1)
+        args = self.parser.parse_args(["table", "ncm", "-j", "4"])
+        args.func(args)
+        self.assertEqual(mock_run_tasks.call_args.kwargs["jobs"], 1)
+        args = self.parser.parse_args(["table", "ncm", "uf", "-j", "4"])
+        args.func(args)
+        self.assertEqual(mock_run_tasks.call_args.kwargs["jobs"], 2)
+        args = self.parser.parse_args(["table", "ncm", "uf"])
+        self.assertEqual(args.jobs, 1)
+
+    @mock.patch("comexdown.cli.get_table")
+    def test_download_table_all(self, mock_get_table):
+        args = self.parser.parse_args(["table", "all", "-j", "2"])
+        args.func(args)
+        self.assertEqual(mock_get_table.call_count, len(AUX_TABLES))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -13,24 +13,49 @@ class TestFunctions(unittest.TestCase):
 
     def test_get_year(self, mock_download):
         comexdown.get_year(self.path, year=2000, exp=True, imp=True)
-        mock_download.exp.assert_called()
-        mock_download.imp.assert_called()
+        mock_download.trade.assert_any_call(
+            kind="exp", year=2000, path=Path("tmp", "exp", "EXP_2000.csv"))
+        mock_download.trade.assert_any_call(
+            kind="imp", year=2000, path=Path("tmp", "imp", "IMP_2000.csv"))
         comexdown.get_year(self.path, year=2000, exp=True, imp=True, mun=True)
-        mock_download.exp_mun.assert_called()
-        mock_download.imp_mun.assert_called()
+        mock_download.trade.assert_any_call(
+            kind="exp_mun",
+            year=2000,
+            path=Path("tmp", "exp-mun", "EXP_2000_MUN.csv"),
+        )
+        mock_download.trade.assert_any_call(
+            kind="imp_mun",
+            year=2000,
+            path=Path("tmp", "imp-mun", "IMP_2000_MUN.csv"),
+        )
+        self.assertEqual(mock_download.trade.call_count, 4)
 
     def test_get_year_nbm(self, mock_download):
-        comexdown.get_year_nbm(self.path, 2000, exp=True, imp=True)
-        mock_download.exp_nbm.assert_called()
-        mock_download.imp_nbm.assert_called()
+        comexdown.get_year_nbm(self.path, 1990, exp=True, imp=False)
+        mock_download.trade.assert_called_once_with(
+            kind="exp_nbm",
+            year=1990,
+            path=Path("tmp", "exp-nbm", "EXP_1990_NBM.csv"),
+        )
 
     def test_get_complete(self, mock_download):
         comexdown.get_complete(self.path, exp=True, imp=True)
-        mock_download.exp_complete.assert_called()
-        mock_download.imp_complete.assert_called()
-        comexdown.get_complete(self.path, exp=True, imp=True, mun=True)
-        mock_download.exp_mun_complete.assert_called()
-        mock_download.imp_mun_complete.assert_called()
+        mock_download.trade.assert_any_call(
+            kind="exp_complete",
+            year=None,
+            path=Path("tmp", "exp", "EXP_COMPLETA.zip"),
+        )
+        mock_download.trade.assert_any_call(
+            kind="imp_complete",
+            year=None,
+            path=Path("tmp", "imp", "IMP_COMPLETA.zip"),
+        )
+        comexdown.get_complete(self.path, exp=False, imp=True, mun=True)
+        mock_download.trade.assert_called_with(
+            kind="imp_mun_complete",
+            year=None,
+            path=Path("tmp", "imp-mun", "IMP_COMPLETA_MUN.zip"),
+        )
 
     def test_get_table(self, mock_download):
         comexdown.get_table(self.path, "ncm")
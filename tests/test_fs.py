@@ -16,6 +16,7 @@ class TestFS(unittest.TestCase):
         self.assertEqual(
             path, Path("tmp", "auxiliary-tables", "NCM.csv")
         )
+        self.assertIsNone(fs.path_aux(self.root, "unknown"))
 
     def test_path_trade(self):
         path = fs.path_trade(self.root, "exp", 2020, mun=False)
@@ -35,6 +36,29 @@ class TestFS(unittest.TestCase):
             path, Path("tmp", "imp-mun", "IMP_2020_MUN.csv")
         )
 
+    def test_path_str_root(self):
+        self.assertEqual(
+            fs.path_trade("tmp", "exp", 2020),
+            fs.path_trade(self.root, "exp", 2020),
+        )
+        self.assertEqual(
+            fs.path_aux("tmp", "uf"), Path("tmp", "auxiliary-tables", "UF.csv")
+        )
+
+    def test_path_trade_direction(self):
+        path = fs.path_trade(self.root, "EXP", 2020, mun=True)
+        self.assertEqual(
+            path, Path("tmp", "exp-mun", "EXP_2020_MUN.csv")
+        )
+        with self.assertRaises(ValueError):
+            fs.path_trade(self.root, "xyz", 2020)
+
+    def test_path_cache(self):
+        self.assertIs(
+            fs.path_trade(self.root, "imp", 2021, mun=True),
+            fs.path_trade(self.root, "imp", 2021, mun=True),
+        )
+
     def test_path_trade_nbm(self):
         path = fs.path_trade_nbm(self.root, "exp", 1990)
         self.assertEqual(
@@ -45,6 +69,16 @@ class TestFS(unittest.TestCase):
             path, Path("tmp", "imp-nbm", "IMP_1990_NBM.csv")
         )
 
+    def test_path_complete(self):
+        path = fs.path_complete(self.root, "exp")
+        self.assertEqual(
+            path, Path("tmp", "exp", "EXP_COMPLETA.zip")
+        )
+        path = fs.path_complete(self.root, "imp", mun=True)
+        self.assertEqual(
+            path, Path("tmp", "imp-mun", "IMP_COMPLETA_MUN.zip")
+        )
+
     @staticmethod
     def tearDown():
         Path("testdata.csv").unlink()